@@ -10,12 +10,23 @@ import time
 import sqlite3
 import requests
 import csv
-import json
+import gzip
+import io
+import orjson
 import random
+import base64
+import hashlib
+import hmac
+import logging
 import signal
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional, List, Tuple, Dict
+from requests.adapters import HTTPAdapter
 from requests_oauthlib import OAuth1
+from oauthlib.oauth1 import Client as OAuth1Client, SIGNATURE_HMAC_SHA1
+from oauthlib.oauth1.rfc5849.utils import escape
+from urllib3.util.retry import Retry
 from datetime import datetime
 
 # Always flush prints immediately so logs are visible during waits
@@ -34,9 +45,52 @@ TWEET_ID = os.environ.get("TWEET_ID")
 DB_PATH = os.environ.get("DB_PATH", "state.db")
 OUT_DIR = os.environ.get("OUT_DIR", ".")
 EXPORT_EVERY_SECS = int(os.environ.get("EXPORT_EVERY_SECS", "300"))  # 5 minutes
+MAX_OUTAGE_SECS = int(os.environ.get("MAX_OUTAGE_SECS", "3600"))  # Give up after this long without a successful request
+EXPORT_MIN_DELTA = int(os.environ.get("EXPORT_MIN_DELTA", "500"))  # New users that trigger a periodic export
 S3_URI = os.environ.get("S3_URI")  # Optional S3 upload
 API_BASE = "https://api.twitter.com/2"
 EXPORT_MODE = os.environ.get("EXPORT_MODE", "final").lower()  # 'final' or 'periodic'
+EXPORT_FORMAT = os.environ.get("EXPORT_FORMAT", "csv").lower()  # 'csv', 'csv.gz' or 'parquet'
+# Applied only once ingest has finished and just the final export remains; ingest always uses NORMAL
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL").upper()  # 'OFF' trades durability for speed
+FULL_PROFILE = os.environ.get("FULL_PROFILE") == "true"
+# Only request the profile fields that are needed; smaller pages are cheaper to fetch
+USER_FIELDS = ",".join(
+    field.strip() for field in (
+        os.environ.get("USER_FIELDS")
+        or ("id,name,username,verified,created_at,description,public_metrics" if FULL_PROFILE else "id,username,name")
+    ).split(",") if field.strip()
+)
+# Columns for optional fields that were not requested are stored as NULL
+USER_FIELD_SET = frozenset(USER_FIELDS.split(","))
+HAS_VERIFIED = "verified" in USER_FIELD_SET
+HAS_CREATED_AT = "created_at" in USER_FIELD_SET
+HAS_DESCRIPTION = "description" in USER_FIELD_SET
+HAS_METRICS = "public_metrics" in USER_FIELD_SET
+REPOLL = os.environ.get("REPOLL") == "true"  # Re-check a completed tweet for new likes on start
+TEST_MODE = os.environ.get("TEST_MODE") == "true"
+QUICK_TEST = os.environ.get("QUICK_TEST") == "true"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()  # 'DEBUG' enables verbose logs
+
+# Verbose diagnostics go through logging so they cost nothing unless LOG_LEVEL=DEBUG;
+# high-level progress is still printed
+logging.basicConfig(level=getattr(logging, LOG_LEVEL, logging.INFO), format="%(message)s", stream=sys.stdout)
+logger = logging.getLogger("fetch_likers")
+
+# Column order shared by the export query, CSV header and Parquet schema
+EXPORT_COLUMNS = [
+    "tweet_id", "user_id", "username", "name", "verified",
+    "created_at", "description", "profile_url", "public_metrics"
+]
+EXPORT_BATCH_SIZE = 10_000
+
+# Prepared once so SQLite's statement cache reuses the compiled statement
+INSERT_LIKER_SQL = """
+    INSERT INTO likers
+    (tweet_id, user_id, username, name, verified, created_at, description, profile_url, public_metrics)
+    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(tweet_id, user_id) DO NOTHING
+"""
 
 # Validate required environment variables
 if not all([CONSUMER_KEY, CONSUMER_SECRET, ACCESS_TOKEN, ACCESS_TOKEN_SECRET, TWEET_ID]):
@@ -44,35 +98,83 @@ if not all([CONSUMER_KEY, CONSUMER_SECRET, ACCESS_TOKEN, ACCESS_TOKEN_SECRET, TW
     print("   CONSUMER_KEY, CONSUMER_SECRET, ACCESS_TOKEN, ACCESS_TOKEN_SECRET, TWEET_ID", file=sys.stderr)
     sys.exit(1)
 
+if SQLITE_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    print(f"❌ Invalid SQLITE_SYNCHRONOUS '{SQLITE_SYNCHRONOUS}' (expected OFF, NORMAL, FULL or EXTRA)", file=sys.stderr)
+    sys.exit(1)
+
+if EXPORT_FORMAT not in ("csv", "csv.gz", "parquet"):
+    print(f"❌ Invalid EXPORT_FORMAT '{EXPORT_FORMAT}' (expected csv, csv.gz or parquet)", file=sys.stderr)
+    sys.exit(1)
+
+# Parquet export is optional and needs pyarrow
+if EXPORT_FORMAT == "parquet":
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("❌ EXPORT_FORMAT=parquet requires pyarrow (pip install pyarrow)", file=sys.stderr)
+        sys.exit(1)
+
 # Create output directory
 os.makedirs(OUT_DIR, exist_ok=True)
 
-# Global stop flag for graceful shutdown
+# Global stop flag for graceful shutdown; the event lets blocking waits wake up immediately
 stop_flag = False
+stop_event = threading.Event()
 
 def handle_stop(signum, frame):
     """Handle SIGTERM and SIGINT for graceful shutdown"""
     global stop_flag
     print(f"\n🛑 Received signal {signum}, setting stop flag...")
     stop_flag = True
+    stop_event.set()
 
 # Register signal handlers
 signal.signal(signal.SIGTERM, handle_stop)
 signal.signal(signal.SIGINT, handle_stop)
 
+def sign_hmac_sha1_cached(base_string: str, client: "CachedSigningClient") -> str:
+    """HMAC-SHA1 OAuth signature reusing the client's pre-keyed HMAC state"""
+    signature = client.signing_hmac.copy()
+    signature.update(base_string.encode("utf-8"))
+    return base64.b64encode(signature.digest()).decode("utf-8")
+
+class CachedSigningClient(OAuth1Client):
+    """OAuth1 client that derives the HMAC-SHA1 signing key once instead of per request"""
+    SIGNATURE_METHODS = {**OAuth1Client.SIGNATURE_METHODS, SIGNATURE_HMAC_SHA1: sign_hmac_sha1_cached}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        key = f"{escape(self.client_secret or '')}&{escape(self.resource_owner_secret or '')}"
+        self.signing_hmac = hmac.new(key.encode("utf-8"), digestmod=hashlib.sha1)
+
 class TwitterLikesFetcher:
     def __init__(self):
         self.db_path = DB_PATH
         self.out_dir = OUT_DIR
         self.tweet_id = TWEET_ID
         self.export_interval = EXPORT_EVERY_SECS
+        self.export_min_delta = EXPORT_MIN_DELTA
+        
+        # Circuit breaker shared across pages so a sustained outage stops retries quickly
+        self.breaker = {'fail_streak': 0, 'open_until': 0, 'outage_since': 0}
+        self.max_outage_secs = MAX_OUTAGE_SECS
+        
+        # Request URL and parameters are constant for the whole run
+        self._likes_url = f"{API_BASE}/tweets/{self.tweet_id}/liking_users"
+        self._base_params = {
+            'user.fields': USER_FIELDS,
+            # Use smaller max_results for testing if TEST_MODE or QUICK_TEST is set
+            'max_results': 2 if TEST_MODE or QUICK_TEST else 100
+        }
         
         # Setup OAuth 1.0a authentication
         self.auth = OAuth1(
             CONSUMER_KEY,
             CONSUMER_SECRET,
             ACCESS_TOKEN,
-            ACCESS_TOKEN_SECRET
+            ACCESS_TOKEN_SECRET,
+            client_class=CachedSigningClient
         )
         
         # Setup requests session
@@ -80,16 +182,28 @@ class TwitterLikesFetcher:
         self.session.auth = self.auth
         self.session.headers.update({
             'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
             'User-Agent': 'twitter-likes-fetcher/1.0'
         })
+        # Small keep-alive pool; retries are left to fetch_page's own backoff
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            pool_block=True,
+            max_retries=Retry(total=0, raise_on_status=False)
+        ))
         
         # Initialize database
         self.init_database()
         
-        # Start periodic export thread only if explicitly requested
-        if EXPORT_MODE == "periodic":
-            self.export_thread = threading.Thread(target=self.periodic_export, daemon=True)
-            self.export_thread.start()
+        # Single DB writer so page N is stored while page N+1 is being fetched
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        
+        # Periodic exports run here, triggered from run() only when new data has arrived
+        self.export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="exporter")
+        self.export_future: Optional[Future] = None
+        self.last_exported_count = 0
+        self.last_export_at = 0.0
         
         print(f"🚀 Twitter Likes Fetcher initialized")
         print(f"📱 Tweet ID: {self.tweet_id}")
@@ -98,14 +212,27 @@ class TwitterLikesFetcher:
         print(f"📁 Output: {self.out_dir}")
         print()
 
+    def connect(self) -> sqlite3.Connection:
+        """Open a SQLite connection with the WAL tuning PRAGMAs applied"""
+        # Shared between the main and export threads; access is serialized by the locks below
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Keep temp tables/indices in memory, 64 MiB page cache, 256 MiB mmap
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA wal_autocheckpoint=1000")
+        return conn
+
     def init_database(self):
         """Initialize SQLite database with required tables"""
-        self.conn = sqlite3.connect(self.db_path, timeout=30)
-        self.conn.execute("PRAGMA journal_mode=WAL")
-        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # One mutex-guarded writer and one reader connection, as recommended under WAL
+        self.write_conn = self.connect()
+        self.write_lock = threading.RLock()
         
         # Create tables
-        self.conn.execute("""
+        self.write_conn.execute("""
             CREATE TABLE IF NOT EXISTS likers (
                 tweet_id TEXT NOT NULL,
                 user_id TEXT NOT NULL,
@@ -120,92 +247,144 @@ class TwitterLikesFetcher:
             )
         """)
         
-        self.conn.execute("""
+        # Covering index so the CSV export is answered without row lookups
+        self.write_conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_likers_export ON likers(
+                tweet_id, user_id, username, name, verified, created_at,
+                description, profile_url, public_metrics
+            )
+        """)
+        
+        self.write_conn.execute("""
             CREATE TABLE IF NOT EXISTS state (
                 tweet_id TEXT PRIMARY KEY,
                 next_token TEXT,
                 done INTEGER DEFAULT 0,
                 last_request_time INTEGER,
                 total_users_found INTEGER DEFAULT 0,
-                last_export_time INTEGER DEFAULT 0
+                last_export_time INTEGER DEFAULT 0,
+                last_export_rowid INTEGER DEFAULT 0,
+                last_export_path TEXT,
+                boundary_user_id TEXT
             )
         """)
+        self.ensure_column("state", "boundary_user_id", "TEXT")
+        # Added with 0, which makes the next periodic export rewrite the file in full
+        self.ensure_column("state", "last_export_rowid", "INTEGER DEFAULT 0")
+        self.ensure_column("state", "last_export_path", "TEXT")
+        
+        self.write_conn.commit()
         
-        self.conn.commit()
+        self.read_conn = self.connect()
+        self.read_lock = threading.RLock()
         print("✅ Database initialized")
 
+    def enter_export_phase(self):
+        """Switch both connections to SQLITE_SYNCHRONOUS once ingest is over and only exports remain"""
+        if SQLITE_SYNCHRONOUS == "NORMAL":
+            return
+        with self.write_lock:
+            self.write_conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        with self.read_lock:
+            self.read_conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+
+    def ensure_column(self, table: str, column: str, definition: str):
+        """Add a column to an existing table if an older schema lacks it"""
+        columns = {row[1] for row in self.write_conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self.write_conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
     def get_state(self, tweet_id: str) -> Tuple[Optional[str], bool, int, int]:
         """Get current state for a tweet"""
-        print(f"🔍 VERBOSE: Getting state for tweet {tweet_id}")
-        row = self.conn.execute(
-            "SELECT next_token, done, total_users_found, last_export_time FROM state WHERE tweet_id=?",
-            (tweet_id,)
-        ).fetchone()
+        logger.debug("🔍 VERBOSE: Getting state for tweet %s", tweet_id)
+        with self.read_lock:
+            row = self.read_conn.execute(
+                "SELECT next_token, done, total_users_found, last_export_time FROM state WHERE tweet_id=?",
+                (tweet_id,)
+            ).fetchone()
         
         if row:
-            print(f"🔍 VERBOSE: Found existing state: next_token={row[0]}, done={bool(row[1])}, total_users={row[2]}, last_export={row[3]}")
+            logger.debug("🔍 VERBOSE: Found existing state: next_token=%s, done=%s, total_users=%s, last_export=%s", row[0], bool(row[1]), row[2], row[3])
             return row[0], bool(row[1]), row[2], row[3]
         
         # Initialize state for new tweet
-        print(f"🔍 VERBOSE: No existing state found, initializing new state")
-        with self.conn:
-            self.conn.execute(
+        logger.debug("🔍 VERBOSE: No existing state found, initializing new state")
+        with self.write_lock, self.write_conn:
+            self.write_conn.execute(
                 "INSERT OR IGNORE INTO state(tweet_id,next_token,done,total_users_found,last_export_time) VALUES(?,NULL,0,0,0)",
                 (tweet_id,)
             )
         return None, False, 0, 0
 
-    def save_state(self, tweet_id: str, next_token: Optional[str], done: bool, total_users: int):
+    def get_boundary_user_id(self, tweet_id: str) -> Optional[str]:
+        """Get the first user seen on the first page of the last pass"""
+        with self.read_lock:
+            row = self.read_conn.execute(
+                "SELECT boundary_user_id FROM state WHERE tweet_id=?", (tweet_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_state(self, tweet_id: str, next_token: Optional[str], done: bool, total_users: int,
+                   boundary_user_id: Optional[str] = None):
         """Save current state for a tweet"""
         current_time = int(time.time())
-        print(f"🔍 VERBOSE: Saving state: next_token={next_token}, done={done}, total_users={total_users}")
-        with self.conn:
-            self.conn.execute(
-                "UPDATE state SET next_token=?, done=?, total_users_found=?, last_request_time=? WHERE tweet_id=?",
-                (next_token, int(done), total_users, current_time, tweet_id)
+        logger.debug("🔍 VERBOSE: Saving state: next_token=%s, done=%s, total_users=%s", next_token, done, total_users)
+        with self.write_lock, self.write_conn:
+            self.write_conn.execute(
+                "UPDATE state SET next_token=?, done=?, total_users_found=?, last_request_time=?, "
+                "boundary_user_id=COALESCE(?, boundary_user_id) WHERE tweet_id=?",
+                (next_token, int(done), total_users, current_time, boundary_user_id, tweet_id)
             )
-        print(f"🔍 VERBOSE: State saved successfully")
+        logger.debug("🔍 VERBOSE: State saved successfully")
 
-    def update_export_time(self, tweet_id: str):
-        """Update last export time"""
+    def update_export_time(self, tweet_id: str, last_rowid: Optional[int] = None, export_path: Optional[str] = None):
+        """Update last export time (and the delta export watermark and its file when given)"""
         current_time = int(time.time())
-        with self.conn:
-            self.conn.execute(
-                "UPDATE state SET last_export_time=? WHERE tweet_id=?",
-                (current_time, tweet_id)
+        with self.write_lock, self.write_conn:
+            self.write_conn.execute(
+                "UPDATE state SET last_export_time=?, last_export_rowid=COALESCE(?, last_export_rowid), "
+                "last_export_path=COALESCE(?, last_export_path) WHERE tweet_id=?",
+                (current_time, last_rowid, export_path, tweet_id)
             )
 
     def insert_users(self, tweet_id: str, users: List[Dict]):
         """Insert users into database, ignoring duplicates"""
-        with self.conn:
-            for user in users:
+        dumps = orjson.dumps  # Local alias: avoids a module attribute lookup per row
+        rows = [
+            (
+                tweet_id,
+                user.get('id'),
+                username,
+                user.get('name'),
+                int(bool(user.get('verified'))) if HAS_VERIFIED else None,
+                user.get('created_at') if HAS_CREATED_AT else None,
+                user.get('description', '') if HAS_DESCRIPTION else None,
                 # Construct profile URL
-                username = user.get('username', '')
-                profile_url = f"https://x.com/{username}" if username else ""
-                
+                f"https://x.com/{username}" if username else "",
                 # Store public_metrics as JSON string
-                public_metrics = json.dumps(user.get('public_metrics', {}))
-                
-                self.conn.execute("""
-                    INSERT OR IGNORE INTO likers
-                    (tweet_id, user_id, username, name, verified, created_at, description, profile_url, public_metrics)
-                    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    tweet_id,
-                    user.get('id'),
-                    user.get('username'),
-                    user.get('name'),
-                    int(bool(user.get('verified'))),
-                    user.get('created_at'),
-                    user.get('description', ''),
-                    profile_url,
-                    public_metrics
-                ))
+                dumps(user.get('public_metrics', {})).decode() if HAS_METRICS else None
+            )
+            for user in users
+            for username in (user.get('username'),)
+        ]
+        
+        # One statement, one transaction for the whole page
+        with self.write_lock, self.write_conn:
+            self.write_conn.executemany(INSERT_LIKER_SQL, rows)
+
+    def store_page(self, tweet_id: str, users: List[Dict], next_token: Optional[str], done: bool, total_users: int,
+                   boundary_user_id: Optional[str] = None):
+        """Insert a page of users and checkpoint pagination state (runs on the DB writer thread)"""
+        if users:
+            self.insert_users(tweet_id, users)
+        self.save_state(tweet_id, next_token, done, total_users, boundary_user_id)
+        # Checked as soon as the page is committed, not after the next (possibly rate-limited) fetch
+        self.maybe_export(total_users)
 
     def pace_requests(self, response):
         """Handle rate limiting based on response headers"""
-        print(f"🔍 VERBOSE: Response status: {response.status_code}")
-        print(f"🔍 VERBOSE: Rate limit headers: remaining={response.headers.get('x-rate-limit-remaining', 'N/A')}, reset={response.headers.get('x-rate-limit-reset', 'N/A')}")
+        logger.debug("🔍 VERBOSE: Response status: %s", response.status_code)
+        logger.debug("🔍 VERBOSE: Rate limit headers: remaining=%s, reset=%s", response.headers.get('x-rate-limit-remaining', 'N/A'), response.headers.get('x-rate-limit-reset', 'N/A'))
         
         try:
             remaining = int(response.headers.get("x-rate-limit-remaining", "1"))
@@ -213,10 +392,10 @@ class TwitterLikesFetcher:
         except (ValueError, TypeError):
             remaining, reset = 1, 0
         
-        print(f"🔍 VERBOSE: Parsed remaining={remaining}, reset={reset}")
+        logger.debug("🔍 VERBOSE: Parsed remaining=%s, reset=%s", remaining, reset)
         
         # In QUICK_TEST mode, do not sleep here to keep tests fast; just log
-        if os.environ.get("QUICK_TEST") == "true":
+        if QUICK_TEST:
             print(f"⏳ QUICK_TEST: Skipping waits in pace_requests (remaining={remaining}, reset={reset})")
             return
         else:
@@ -224,74 +403,80 @@ class TwitterLikesFetcher:
                 # Calculate wait time until rate limit resets (interruptible)
                 current_time = int(time.time())
                 wait_time = max(0, reset - current_time) + 2  # Add 2 second buffer
-                print(f"⏳ Rate limit reached. Waiting {wait_time} seconds until reset...")
-                for remaining_sec in range(wait_time, 0, -1):
-                    if stop_flag:
-                        print("🛑 Stop flag set during wait; breaking wait")
-                        break
-                    if remaining_sec % 10 == 0 or remaining_sec <= 5:
-                        print(f"⏳ {remaining_sec} seconds remaining...")
-                    time.sleep(1)
+                print(f"⏳ Rate limit reached. Waiting {wait_time} seconds until reset (until {datetime.fromtimestamp(current_time + wait_time):%H:%M:%S})...")
+                if stop_event.wait(timeout=wait_time):
+                    print("🛑 Stop flag set during wait; breaking wait")
+                else:
+                    print("✅ Rate limit wait complete")
             elif remaining <= 5:
                 # If we're close to the limit, add a small delay
                 delay = random.uniform(1, 3)
                 print(f"⏳ Approaching rate limit ({remaining} remaining). Waiting {delay:.1f}s...")
-                time.sleep(delay)
+                stop_event.wait(timeout=delay)
 
     def backoff_sleep(self, attempt: int):
         """Exponential backoff for retries"""
         delay = min(300, (2 ** attempt)) + random.uniform(0, 1.2)
         print(f"⏳ Backoff attempt {attempt + 1}, waiting {delay:.1f}s...")
-        time.sleep(delay)
+        stop_event.wait(timeout=delay)
+
+    def record_failure(self) -> bool:
+        """Count a server/network failure; returns True once the circuit breaker opens"""
+        self.breaker['fail_streak'] += 1
+        fail_streak = self.breaker['fail_streak']
+        if fail_streak == 1:
+            self.breaker['outage_since'] = time.time()
+        if fail_streak > 3:
+            cooldown = min(600, 30 * 2 ** fail_streak)
+            self.breaker['open_until'] = time.time() + cooldown
+            print(f"🚧 {fail_streak} consecutive failures; pausing requests for {cooldown}s", file=sys.stderr)
+            return True
+        return False
 
     def fetch_page(self, tweet_id: str, next_token: Optional[str]) -> Dict:
         """Fetch a page of users who liked the tweet"""
-        url = f"{API_BASE}/tweets/{tweet_id}/liking_users"
-        
-        # Use smaller max_results for testing if TEST_MODE is set
-        if os.environ.get("TEST_MODE") == "true":
-            max_results = 2  # Very small for quick testing
-        elif os.environ.get("QUICK_TEST") == "true":
-            max_results = 2  # Quick test mode
-        else:
-            max_results = 100  # Production mode
-        
-        params = {
-            'user.fields': 'id,name,username,verified,created_at,description,public_metrics',
-            'max_results': max_results
-        }
+        url = self._likes_url if tweet_id == self.tweet_id else f"{API_BASE}/tweets/{tweet_id}/liking_users"
         
-        if next_token:
-            params['pagination_token'] = next_token
+        # Only the pagination token varies between requests
+        params = {**self._base_params, 'pagination_token': next_token} if next_token else self._base_params
         
         for attempt in range(7):  # Max 7 retry attempts
+            if stop_flag:
+                return None
+            if time.time() < self.breaker['open_until']:
+                print("🚧 Circuit breaker open; skipping request", file=sys.stderr)
+                return None
+            
             try:
                 print(f"📡 Fetching page (attempt {attempt + 1})...")
-                print(f"🔍 VERBOSE: URL: {url}")
-                print(f"🔍 VERBOSE: Params: {params}")
+                logger.debug("🔍 VERBOSE: URL: %s", url)
+                logger.debug("🔍 VERBOSE: Params: %s", params)
                 response = self.session.get(url, params=params, timeout=30)
                 
-                print(f"🔍 VERBOSE: Response received, status: {response.status_code}")
+                logger.debug("🔍 VERBOSE: Response received, status: %s", response.status_code)
                 
                 # Handle rate limiting
                 self.pace_requests(response)
                 
                 if response.status_code == 200:
-                    data = response.json()
+                    data = orjson.loads(response.content)
+                    self.breaker['fail_streak'] = 0
+                    self.breaker['outage_since'] = 0
                     print(f"✅ Successfully fetched page")
-                    print(f"🔍 VERBOSE: Response data keys: {list(data.keys())}")
-                    if 'data' in data:
-                        print(f"🔍 VERBOSE: Found {len(data['data'])} users in response")
-                    if 'meta' in data:
-                        print(f"🔍 VERBOSE: Meta: {data['meta']}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("🔍 VERBOSE: Response data keys: %s", list(data.keys()))
+                        if 'data' in data:
+                            logger.debug("🔍 VERBOSE: Found %d users in response", len(data['data']))
+                        if 'meta' in data:
+                            logger.debug("🔍 VERBOSE: Meta: %s", data['meta'])
                     return data
                 
                 elif response.status_code == 429:
                     # Rate limited - use server reset time if available
                     print(f"🚨 429 RATE LIMITED! Attempt {attempt + 1}")
-                    print(f"🔍 VERBOSE: Got 429, checking reset time...")
+                    logger.debug("🔍 VERBOSE: Got 429, checking reset time...")
                     reset = int(response.headers.get("x-rate-limit-reset", "0") or "0")
-                    print(f"🔍 VERBOSE: Reset timestamp from header: {reset}")
+                    logger.debug("🔍 VERBOSE: Reset timestamp from header: %s", reset)
                     
                     if reset:
                         current_time = int(time.time())
@@ -300,21 +485,14 @@ class TwitterLikesFetcher:
                         print(f"⏳ Need to wait {delay} seconds until reset...")
                         
                         # For testing, use shorter wait times
-                        if os.environ.get("QUICK_TEST") == "true":
+                        if QUICK_TEST:
                             test_delay = 5
                             print(f"⏳ TESTING: Waiting only {test_delay} seconds instead of {delay}")
                             delay = test_delay
                         
-                        # Countdown timer with stop flag checking
-                        for remaining in range(delay, 0, -1):
-                            if stop_flag:
-                                print(f"🛑 Stop flag set, breaking wait")
-                                return None
-                            if remaining % 10 == 0 or remaining <= 5:
-                                print(f"⏳ {remaining} seconds remaining...")
-                            time.sleep(1)
-                        
-                        if stop_flag:
+                        # Wait until reset; returns early as soon as the stop signal arrives
+                        print(f"⏳ Waiting until {datetime.fromtimestamp(current_time + delay):%H:%M:%S}...")
+                        if stop_event.wait(timeout=delay):
                             print(f"🛑 Stopped during wait")
                             return None
                         
@@ -326,7 +504,9 @@ class TwitterLikesFetcher:
                 
                 elif 500 <= response.status_code < 600:
                     # Server error - retry with backoff
-                    print(f"🔍 VERBOSE: Server error {response.status_code}, retrying...")
+                    logger.debug("🔍 VERBOSE: Server error %s, retrying...", response.status_code)
+                    if self.record_failure():
+                        return None
                     self.backoff_sleep(attempt)
                     continue
                 
@@ -335,8 +515,10 @@ class TwitterLikesFetcher:
                     print(f"❌ HTTP {response.status_code}: {response.text}", file=sys.stderr)
                     return None
                     
-            except requests.RequestException as e:
+            except (requests.RequestException, orjson.JSONDecodeError) as e:
                 print(f"❌ Network error: {e}")
+                if self.record_failure():
+                    return None
                 self.backoff_sleep(attempt)
                 continue
         
@@ -345,51 +527,138 @@ class TwitterLikesFetcher:
 
     def export_csv(self, tweet_id: str) -> str:
         """Export users to CSV file"""
-        return self.export_csv_with_connection(tweet_id, self.conn)
+        # Parquet files cannot be appended to, so they are always rewritten in full
+        if EXPORT_MODE == "periodic" and EXPORT_FORMAT != "parquet":
+            return self.export_delta(tweet_id)
+        
+        with self.read_lock:
+            csv_path = self.export_csv_with_connection(tweet_id, self.read_conn)
+        self.update_export_time(tweet_id)
+        return csv_path
 
-    def export_csv_with_connection(self, tweet_id: str, conn: sqlite3.Connection) -> str:
-        """Export users to CSV file using provided connection"""
+    def export_path(self, tweet_id: str) -> str:
+        """Build the export file path for a tweet"""
         # Append epoch time to filename to avoid overwriting on repeated runs
         epoch_suffix = str(int(time.time())) if EXPORT_MODE == "final" else "current"
-        csv_path = os.path.join(self.out_dir, f"{tweet_id}_likers_{epoch_suffix}.csv")
+        return os.path.join(self.out_dir, f"{tweet_id}_likers_{epoch_suffix}.{EXPORT_FORMAT}")
+
+    def export_csv_with_connection(self, tweet_id: str, conn: sqlite3.Connection) -> str:
+        """Export users to CSV (or EXPORT_FORMAT) file using provided connection"""
+        export_path = self.export_path(tweet_id)
         
-        # Get all users for this tweet
-        cursor = conn.execute("""
-            SELECT user_id, username, name, verified, created_at, description, profile_url, public_metrics
+        # Get all users for this tweet; tweet_id is selected so rows stream straight into the writer
+        cursor = conn.execute(f"""
+            SELECT {", ".join(EXPORT_COLUMNS)}
             FROM likers 
             WHERE tweet_id=? 
             ORDER BY user_id
         """, (tweet_id,))
         
-        with open(csv_path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "tweet_id", "user_id", "username", "name", "verified", 
-                "created_at", "description", "profile_url", "public_metrics"
-            ])
+        if EXPORT_FORMAT == "parquet":
+            self.write_parquet(cursor, export_path)
+        else:
+            self.write_csv(cursor, export_path)
+        
+        return export_path
+
+    def export_delta(self, tweet_id: str) -> str:
+        """Append rows stored since the last export to the current CSV file"""
+        export_path = self.export_path(tweet_id)
+        
+        with self.read_lock:
+            since, last_path = self.read_conn.execute(
+                "SELECT last_export_rowid, last_export_path FROM state WHERE tweet_id=?", (tweet_id,)
+            ).fetchone()
+            # Watermark from committed data: rows still being written get higher rowids than
+            # anything visible here, so they are picked up by the next export
+            until = self.read_conn.execute("SELECT MAX(rowid) FROM likers").fetchone()[0] or 0
+            
+            # The watermark belongs to the file it was written to; switching EXPORT_FORMAT
+            # (or OUT_DIR) and back must not append onto a file that missed the rows in between
+            if since and last_path == export_path and os.path.exists(export_path):
+                # Unary + keeps SQLite on the rowid range instead of scanning the whole tweet
+                cursor = self.read_conn.execute(f"""
+                    SELECT {", ".join(EXPORT_COLUMNS)}
+                    FROM likers
+                    WHERE rowid > ? AND rowid <= ? AND +tweet_id=?
+                    ORDER BY user_id
+                """, (since, until, tweet_id))
+                self.write_csv(cursor, export_path, append=True)
+            else:
+                # No file, no watermark yet, or the watermark is for another file: rewrite
+                # everything stored so far
+                cursor = self.read_conn.execute(f"""
+                    SELECT {", ".join(EXPORT_COLUMNS)}
+                    FROM likers
+                    WHERE tweet_id=? AND rowid <= ?
+                    ORDER BY user_id
+                """, (tweet_id, until))
+                self.write_csv(cursor, export_path)
             
-            for row in cursor:
-                writer.writerow([tweet_id] + list(row))
+            self.update_export_time(tweet_id, until, export_path)
         
-        # Update export time (only if using main connection)
-        if conn == self.conn:
-            self.update_export_time(tweet_id)
+        return export_path
+
+    def write_csv(self, cursor: sqlite3.Cursor, csv_path: str, append: bool = False):
+        """Stream cursor rows into a plain or gzipped CSV file"""
+        if EXPORT_FORMAT == "csv.gz":
+            # Fastest compression level; the export runs alongside ingest.
+            # Appending adds a new gzip member, which readers decompress transparently
+            f = gzip.open(csv_path, "at" if append else "wt", newline="", encoding="utf-8", compresslevel=1)
+        else:
+            # Text layer over one large binary buffer so rows are encoded and flushed in big chunks
+            raw = io.FileIO(csv_path, "a" if append else "w")
+            f = io.TextIOWrapper(
+                io.BufferedWriter(raw, buffer_size=1 << 20),
+                encoding="utf-8", newline="", write_through=False
+            )
         
-        return csv_path
+        with f:
+            writer = csv.writer(f)
+            if not append:
+                writer.writerow(EXPORT_COLUMNS)
+            writer.writerows(cursor)
+
+    def write_parquet(self, cursor: sqlite3.Cursor, parquet_path: str):
+        """Stream cursor rows into a Parquet file in record batches"""
+        schema = pa.schema([
+            (column, pa.int64() if column == "verified" else pa.string())
+            for column in EXPORT_COLUMNS
+        ])
+        
+        with pq.ParquetWriter(parquet_path, schema) as writer:
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                columns = list(zip(*rows))
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                    schema=schema
+                ))
 
     def periodic_export(self):
-        """Periodically export CSV files"""
-        while not stop_flag:
-            try:
-                time.sleep(self.export_interval)
-                if not stop_flag:
-                    # Create a new database connection for this thread
-                    conn = sqlite3.connect(self.db_path, timeout=30)
-                    csv_path = self.export_csv_with_connection(self.tweet_id, conn)
-                    conn.close()
-                    print(f"📄 Exported CSV: {csv_path}")
-            except Exception as e:
-                print(f"❌ Export error: {e}")
+        """Export CSV in the background (runs on the exporter thread)"""
+        try:
+            csv_path = self.export_csv(self.tweet_id)
+            print(f"📄 Exported CSV: {csv_path}")
+        except Exception as e:
+            print(f"❌ Export error: {e}")
+
+    def maybe_export(self, total_users: int):
+        """Queue a periodic export once enough new users or time have accumulated (runs on the DB writer thread)"""
+        if EXPORT_MODE != "periodic":
+            return
+        # Skip while the previous export is still being written
+        if self.export_future is not None and not self.export_future.done():
+            return
+        
+        now = time.time()
+        if (total_users - self.last_exported_count >= self.export_min_delta
+                or now - self.last_export_at >= self.export_interval):
+            self.last_exported_count = total_users
+            self.last_export_at = now
+            self.export_future = self.export_executor.submit(self.periodic_export)
 
     def estimate_completion_time(self, total_users: int, current_users: int) -> str:
         """Estimate completion time based on current progress"""
@@ -411,24 +680,54 @@ class TwitterLikesFetcher:
         
         next_token, done, total_users, last_export = self.get_state(self.tweet_id)
         
+        if done and REPOLL:
+            # Start a new pass from the first page; the boundary sentinel ends it early if nothing changed
+            print("🔁 REPOLL set; checking completed tweet for new likes")
+            next_token, done = None, False
+        
         if done:
             print("✅ Tweet already completed!")
+            self.enter_export_phase()
             csv_path = self.export_csv(self.tweet_id)
             print(f"📄 Final CSV: {csv_path}")
             return
         
         page_count = 0
-        max_pages = 3 if os.environ.get("QUICK_TEST") == "true" else 999999
+        pending: Optional[Future] = None
+        self.last_exported_count = total_users
+        # Time trigger counts from the run start so a fresh tweet's first page doesn't export at once
+        self.last_export_at = max(last_export, time.time())
+        max_pages = 3 if QUICK_TEST else 999999
         
         while not done and not stop_flag and page_count < max_pages:
             page_count += 1
             print(f"\n📄 Processing page {page_count}...")
-            print(f"🔍 VERBOSE: Current next_token: {next_token}")
-            print(f"🔍 VERBOSE: Total users found so far: {total_users}")
+            logger.debug("🔍 VERBOSE: Current next_token: %s", next_token)
+            logger.debug("🔍 VERBOSE: Total users found so far: %s", total_users)
             
             # Fetch the page
             data = self.fetch_page(self.tweet_id, next_token)
             
+            # Make sure the previous page is stored before queueing more work
+            if pending is not None:
+                pending.result()
+                pending = None
+            
+            # Circuit breaker open: checkpoint, sit out the cooldown and retry the same page,
+            # giving up once the outage would last longer than MAX_OUTAGE_SECS
+            while data is None and not stop_flag:
+                cooldown = self.breaker['open_until'] - time.time()
+                if cooldown <= 0:
+                    break
+                if time.time() + cooldown - self.breaker['outage_since'] > self.max_outage_secs:
+                    print(f"🚧 API unavailable for over {self.max_outage_secs}s; giving up", file=sys.stderr)
+                    break
+                self.save_state(self.tweet_id, next_token, False, total_users)
+                print(f"🚧 Waiting {cooldown:.0f}s for the API to recover before retrying page {page_count}...")
+                if stop_event.wait(timeout=cooldown):
+                    break
+                data = self.fetch_page(self.tweet_id, next_token)
+            
             if data is None:
                 print("❌ Failed to fetch page (likely rate limited or stopped)")
                 print("💾 Saving current state before stopping...")
@@ -437,8 +736,22 @@ class TwitterLikesFetcher:
             
             # Process users
             users = data.get('data', [])
+            
+            # The first user of a pass starting from the first page is kept as a sentinel; if a
+            # later pass starts with the same user, nothing new was liked and paging can stop
+            boundary_user_id = None
+            if next_token is None and users:
+                boundary_user_id = users[0].get('id')
+                if boundary_user_id == self.get_boundary_user_id(self.tweet_id):
+                    print("✅ First user matches the previous pass; no new likes")
+                    done = True
+                    self.save_state(self.tweet_id, None, True, total_users)
+                    break
+                # A new full pass: count its users from scratch instead of on top of the last pass
+                total_users = 0
+                self.last_exported_count = 0
+            
             if users:
-                self.insert_users(self.tweet_id, users)
                 total_users += len(users)
                 print(f"👥 Found {len(users)} users (total: {total_users})")
             else:
@@ -449,8 +762,10 @@ class TwitterLikesFetcher:
             next_token = meta.get('next_token')
             done = not bool(next_token)
             
-            # Save state
-            self.save_state(self.tweet_id, next_token, done, total_users)
+            # Insert users and save state in the background while the next page is fetched
+            pending = self.db_executor.submit(
+                self.store_page, self.tweet_id, users, next_token, done, total_users, boundary_user_id
+            )
             
             # Show progress
             if not done:
@@ -459,10 +774,17 @@ class TwitterLikesFetcher:
             
             # Small delay between requests to be respectful
             if not done and not stop_flag:
-                if os.environ.get("QUICK_TEST") == "true":
-                    time.sleep(1)  # 1 second in test mode
+                if QUICK_TEST:
+                    stop_event.wait(timeout=1)  # 1 second in test mode
                 else:
-                    time.sleep(2)  # 2 seconds in production
+                    stop_event.wait(timeout=2)  # 2 seconds in production
+        
+        # Flush the last queued page and any running export before the final export
+        if pending is not None:
+            pending.result()
+        if self.export_future is not None:
+            self.export_future.result()
+        self.enter_export_phase()
         
         if stop_flag:
             print("🛑 Stopped by user signal")
@@ -473,10 +795,11 @@ class TwitterLikesFetcher:
         
         # Final export only in final or periodic modes, and only if rows exist
         if EXPORT_MODE in ("final", "periodic"):
-            rows = self.conn.execute(
-                "SELECT COUNT(*) FROM likers WHERE tweet_id=?",
-                (self.tweet_id,)
-            ).fetchone()[0]
+            with self.read_lock:
+                rows = self.read_conn.execute(
+                    "SELECT COUNT(*) FROM likers WHERE tweet_id=?",
+                    (self.tweet_id,)
+                ).fetchone()[0]
             if rows > 0:
                 csv_path = self.export_csv(self.tweet_id)
                 print(f"📄 Final CSV exported: {csv_path}")
@@ -486,9 +809,10 @@ class TwitterLikesFetcher:
             print("📄 Skipping CSV export due to EXPORT_MODE")
         
         # Show summary
-        final_count = self.conn.execute(
-            "SELECT COUNT(*) FROM likers WHERE tweet_id=?", (self.tweet_id,)
-        ).fetchone()[0]
+        with self.read_lock:
+            final_count = self.read_conn.execute(
+                "SELECT COUNT(*) FROM likers WHERE tweet_id=?", (self.tweet_id,)
+            ).fetchone()[0]
         print(f"📊 Total users found: {final_count}")
 
 def main():